@@ -1,14 +1,43 @@
+import threading
+import time
+from collections import namedtuple
+from contextlib import asynccontextmanager
 from datetime import date
-from typing import Optional
+from typing import Literal, Optional
 
 from fastapi import Depends, FastAPI, Header, HTTPException
-from pydantic import BaseModel, Field
-from sqlalchemy import (Column, Date, ForeignKey, Integer, String, create_engine,
-                        func)
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import (Column, Date, ForeignKey, Index, Integer, String,
+                        bindparam, create_engine, event, func, insert, select,
+                        text)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, declarative_base, relationship, sessionmaker
 
 DATABASE_URL = "sqlite:///./league.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=10,
+    max_overflow=20,
+    pool_recycle=3600,
+    pool_pre_ping=True,
+    insertmanyvalues_page_size=1000,
+)
+
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL + NORMAL sync cuts fsyncs per commit and lets reads run
+    # concurrently with scorer writes.
+    dbapi_connection.execute("PRAGMA journal_mode=WAL")
+    dbapi_connection.execute("PRAGMA synchronous=NORMAL")
+    dbapi_connection.execute("PRAGMA temp_store=MEMORY")
+    dbapi_connection.execute("PRAGMA mmap_size=268435456")
+    dbapi_connection.execute("PRAGMA cache_size=-65536")
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
 
@@ -18,7 +47,7 @@ class User(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
-    role = Column(String, nullable=False)  # scorer, captain, player
+    role = Column(String, nullable=False, index=True)  # scorer, captain, player
 
 
 class Series(Base):
@@ -35,102 +64,174 @@ class Team(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
-    captain_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    captain_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+
+    # lazy="raise_on_sql" makes any accidental lazy load raise instead of
+    # silently emitting an N+1 query; related rows must be joined in.
+    captain = relationship("User", lazy="raise_on_sql")
 
 
 class Member(Base):
     __tablename__ = "members"
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False, index=True)
+
+    user = relationship("User", lazy="raise_on_sql")
+    team = relationship("Team", lazy="raise_on_sql")
 
 
 class Round(Base):
     __tablename__ = "rounds"
 
     id = Column(Integer, primary_key=True)
-    series_id = Column(Integer, ForeignKey("series.id"), nullable=False)
+    series_id = Column(Integer, ForeignKey("series.id"), nullable=False, index=True)
     name = Column(String, nullable=False)
 
+    series = relationship("Series", lazy="raise_on_sql")
+
 
 class TeamPoint(Base):
     __tablename__ = "team_points"
 
     id = Column(Integer, primary_key=True)
-    round_id = Column(Integer, ForeignKey("rounds.id"), nullable=False)
-    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
+    round_id = Column(Integer, ForeignKey("rounds.id"), nullable=False, index=True)
+    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False, index=True)
     points = Column(Integer, nullable=False, default=0)
 
+    team = relationship("Team", lazy="raise_on_sql")
+
 
 class PlayerPerformance(Base):
     __tablename__ = "player_performance"
 
     id = Column(Integer, primary_key=True)
-    round_id = Column(Integer, ForeignKey("rounds.id"), nullable=False)
-    player_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    round_id = Column(Integer, ForeignKey("rounds.id"), nullable=False, index=True)
+    player_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     performance_points = Column(Integer, nullable=False, default=0)
     is_man_of_match = Column(Integer, nullable=False, default=0)
 
+    player = relationship("User", lazy="raise_on_sql")
+
+
+Index(
+    "ix_perf_round_order",
+    PlayerPerformance.round_id,
+    PlayerPerformance.is_man_of_match.desc(),
+    PlayerPerformance.performance_points.desc(),
+)
+
+# Partial index over only the flagged rows (usually <=1 per round) so the
+# man-of-match lookup is a point query instead of a scan-and-sort.
+Index(
+    "ix_mom",
+    PlayerPerformance.round_id,
+    PlayerPerformance.player_id,
+    sqlite_where=text("is_man_of_match = 1"),
+)
 
 Base.metadata.create_all(bind=engine)
 
 
-def ensure_default_scorer():
+MAX_SCORERS = 6
+
+# Scorer-cap bookkeeping kept in memory so create_user never needs a
+# COUNT query. Seeded once at startup and guarded by a lock; users are
+# never deleted or re-roled through this API.
+_scorer_count = 0
+_scorer_count_lock = threading.Lock()
+
+
+def load_scorer_count():
+    global _scorer_count
     db = SessionLocal()
     try:
-        any_user = db.query(User).first()
-        if not any_user:
-            db.add(User(id=1, name="Default Scorer", role="scorer"))
-            db.commit()
+        _scorer_count = db.query(func.count(User.id)).filter(User.role == "scorer").scalar() or 0
     finally:
         db.close()
 
 
-ensure_default_scorer()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # create_all skips indexes on tables that already exist, so databases
+    # created before an index was added would silently miss it; create any
+    # missing ones here idempotently.
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT OR IGNORE INTO users (id, name, role) "
+            "VALUES (1, 'Default Scorer', 'scorer')"
+        ))
+    load_scorer_count()
+    # Pre-warm the pool so the first requests don't pay connection setup.
+    warm = [engine.connect() for _ in range(engine.pool.size())]
+    for conn in warm:
+        conn.execute(text("SELECT 1"))
+    for conn in warm:
+        conn.close()
+    yield
+
+
+app = FastAPI(title="Series Points API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
-app = FastAPI(title="Series Points API")
 
+class StrictIn(BaseModel):
+    """Shared input config: no type coercion, unknown fields rejected."""
 
-class UserIn(BaseModel):
+    model_config = ConfigDict(strict=True, extra="forbid")
+
+
+class UserIn(StrictIn):
     name: str
-    role: str = Field(pattern="^(scorer|captain|player)$")
+    role: Literal["scorer", "captain", "player"]
 
 
-class SeriesIn(BaseModel):
+class SeriesIn(StrictIn):
     name: str
-    start_date: date
-    end_date: date
+    # JSON has no date type, so allow ISO strings for these two fields.
+    start_date: date = Field(strict=False)
+    end_date: date = Field(strict=False)
 
 
-class TeamIn(BaseModel):
+class TeamIn(StrictIn):
     name: str
     captain_id: int
 
 
-class MemberIn(BaseModel):
+class MemberIn(StrictIn):
     user_id: int
     team_id: int
 
 
-class RoundIn(BaseModel):
+class RoundIn(StrictIn):
     series_id: int
     name: str
 
 
-class TeamPointsIn(BaseModel):
+class TeamPointsIn(StrictIn):
     round_id: int
     team_id: int
     points: int
 
 
-class PlayerPerformanceIn(BaseModel):
+class PlayerPerformanceIn(StrictIn):
     round_id: int
     player_id: int
     performance_points: int
     is_man_of_match: bool = False
 
 
+class TeamPointsBatchIn(StrictIn):
+    items: list[TeamPointsIn]
+
+
+class PlayerPerformanceBatchIn(StrictIn):
+    items: list[PlayerPerformanceIn]
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -139,160 +240,258 @@ def get_db():
         db.close()
 
 
+Actor = namedtuple("Actor", ["id", "role"])
+
+# user_id -> (role, expiry); roles are immutable in this API, the TTL only
+# bounds staleness if the database is edited out of band.
+_role_cache = {}
+_ROLE_CACHE_TTL = 60.0
+_ROLE_CACHE_MAX = 1024
+
+
 def get_actor(x_user_id: Optional[int] = Header(default=None), db: Session = Depends(get_db)):
     if x_user_id is None:
         raise HTTPException(status_code=401, detail="x-user-id header is required")
-    actor = db.get(User, x_user_id)
-    if not actor:
+    now = time.monotonic()
+    cached = _role_cache.get(x_user_id)
+    if cached and cached[1] > now:
+        return Actor(id=x_user_id, role=cached[0])
+    row = db.query(User.role).filter(User.id == x_user_id).first()
+    if not row:
         raise HTTPException(status_code=401, detail="invalid x-user-id")
-    return actor
+    if len(_role_cache) >= _ROLE_CACHE_MAX:
+        _role_cache.clear()
+    _role_cache[x_user_id] = (row.role, now + _ROLE_CACHE_TTL)
+    return Actor(id=x_user_id, role=row.role)
 
 
-def require_updater(actor: User):
+def require_updater(actor: Actor):
     if actor.role != "scorer":
         raise HTTPException(status_code=403, detail="only scorer users can update data")
 
 
 @app.post("/users")
-def create_user(payload: UserIn, actor: User = Depends(get_actor), db: Session = Depends(get_db)):
+def create_user(payload: UserIn, actor: Actor = Depends(get_actor), db: Session = Depends(get_db)):
     require_updater(actor)
+    global _scorer_count
+    stmt = (
+        insert(User)
+        .values(name=payload.name, role=payload.role)
+        .returning(User.id, User.name, User.role)
+    )
     if payload.role == "scorer":
-        scorer_count = db.query(func.count(User.id)).filter(User.role == "scorer").scalar() or 0
-        if scorer_count >= 6:
-            raise HTTPException(status_code=400, detail="max 6 scorer users allowed")
-    user = User(name=payload.name, role=payload.role)
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+        with _scorer_count_lock:
+            if _scorer_count >= MAX_SCORERS:
+                raise HTTPException(status_code=400, detail="max 6 scorer users allowed")
+            user = db.execute(stmt).one()
+            db.commit()
+            _scorer_count += 1
+    else:
+        user = db.execute(stmt).one()
+        db.commit()
     return {"id": user.id, "name": user.name, "role": user.role}
 
 
 @app.post("/series")
-def create_series(payload: SeriesIn, actor: User = Depends(get_actor), db: Session = Depends(get_db)):
+def create_series(payload: SeriesIn, actor: Actor = Depends(get_actor), db: Session = Depends(get_db)):
     require_updater(actor)
     if payload.end_date < payload.start_date:
         raise HTTPException(status_code=400, detail="end_date must be >= start_date")
     if (payload.end_date - payload.start_date).days > 92:
         raise HTTPException(status_code=400, detail="series period cannot exceed 3 months")
-    series = Series(name=payload.name, start_date=payload.start_date, end_date=payload.end_date)
-    db.add(series)
+    series = db.execute(
+        insert(Series).values(**payload.model_dump()).returning(Series.id, Series.name)
+    ).one()
     db.commit()
-    db.refresh(series)
     return {"id": series.id, "name": series.name}
 
 
 @app.post("/teams")
-def create_team(payload: TeamIn, actor: User = Depends(get_actor), db: Session = Depends(get_db)):
+def create_team(payload: TeamIn, actor: Actor = Depends(get_actor), db: Session = Depends(get_db)):
     require_updater(actor)
-    captain = db.get(User, payload.captain_id)
-    if not captain or captain.role != "captain":
+    captain = (
+        db.query(User.id)
+        .filter(User.id == payload.captain_id, User.role == "captain")
+        .first()
+    )
+    if not captain:
         raise HTTPException(status_code=400, detail="captain_id must be a valid captain")
-    team = Team(name=payload.name, captain_id=payload.captain_id)
-    db.add(team)
+    team = db.execute(
+        insert(Team).values(**payload.model_dump()).returning(Team.id, Team.name)
+    ).one()
     db.commit()
-    db.refresh(team)
     return {"id": team.id, "name": team.name}
 
 
 @app.post("/members")
-def add_member(payload: MemberIn, actor: User = Depends(get_actor), db: Session = Depends(get_db)):
+def add_member(payload: MemberIn, actor: Actor = Depends(get_actor), db: Session = Depends(get_db)):
     require_updater(actor)
-    user = db.get(User, payload.user_id)
-    team = db.get(Team, payload.team_id)
-    if not user or user.role not in {"captain", "player"}:
+    team_exists = db.query(Team.id).filter(Team.id == payload.team_id).exists()
+    row = db.query(User.role, team_exists).filter(User.id == payload.user_id).first()
+    if not row or row[0] not in {"captain", "player"}:
         raise HTTPException(status_code=400, detail="user must be captain or player")
-    if not team:
+    if not row[1]:
         raise HTTPException(status_code=404, detail="team not found")
-    member = Member(user_id=payload.user_id, team_id=payload.team_id)
-    db.add(member)
+    member = db.execute(
+        insert(Member).values(**payload.model_dump()).returning(Member.id)
+    ).one()
     db.commit()
-    db.refresh(member)
     return {"id": member.id}
 
 
 @app.post("/rounds")
-def create_round(payload: RoundIn, actor: User = Depends(get_actor), db: Session = Depends(get_db)):
+def create_round(payload: RoundIn, actor: Actor = Depends(get_actor), db: Session = Depends(get_db)):
     require_updater(actor)
     series = db.get(Series, payload.series_id)
     if not series:
         raise HTTPException(status_code=404, detail="series not found")
-    round_ = Round(series_id=payload.series_id, name=payload.name)
-    db.add(round_)
+    round_ = db.execute(
+        insert(Round).values(**payload.model_dump()).returning(Round.id, Round.name)
+    ).one()
     db.commit()
-    db.refresh(round_)
     return {"id": round_.id, "name": round_.name}
 
 
 @app.post("/team-points")
-def update_team_points(payload: TeamPointsIn, actor: User = Depends(get_actor), db: Session = Depends(get_db)):
+def update_team_points(payload: TeamPointsIn, actor: Actor = Depends(get_actor), db: Session = Depends(get_db)):
     require_updater(actor)
-    record = TeamPoint(round_id=payload.round_id, team_id=payload.team_id, points=payload.points)
-    db.add(record)
-    db.commit()
+    try:
+        db.execute(insert(TeamPoint).values(**payload.model_dump()))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="round_id and team_id must reference existing rows")
     return {"status": "ok"}
 
 
 @app.post("/player-performance")
-def update_player_performance(payload: PlayerPerformanceIn, actor: User = Depends(get_actor), db: Session = Depends(get_db)):
+def update_player_performance(payload: PlayerPerformanceIn, actor: Actor = Depends(get_actor), db: Session = Depends(get_db)):
     require_updater(actor)
-    perf = PlayerPerformance(
-        round_id=payload.round_id,
-        player_id=payload.player_id,
-        performance_points=payload.performance_points,
-        is_man_of_match=1 if payload.is_man_of_match else 0,
-    )
-    db.add(perf)
-    db.commit()
+    try:
+        db.execute(
+            insert(PlayerPerformance).values(
+                round_id=payload.round_id,
+                player_id=payload.player_id,
+                performance_points=payload.performance_points,
+                is_man_of_match=1 if payload.is_man_of_match else 0,
+            )
+        )
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="round_id and player_id must reference existing rows")
     return {"status": "ok"}
 
 
+@app.post("/team-points/bulk")
+def update_team_points_bulk(payload: TeamPointsBatchIn, actor: Actor = Depends(get_actor), db: Session = Depends(get_db)):
+    require_updater(actor)
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    try:
+        db.execute(insert(TeamPoint), [item.model_dump() for item in payload.items])
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="round_id and team_id must reference existing rows")
+    return {"status": "ok", "inserted": len(payload.items)}
+
+
+@app.post("/player-performance/bulk")
+def update_player_performance_bulk(payload: PlayerPerformanceBatchIn, actor: Actor = Depends(get_actor), db: Session = Depends(get_db)):
+    require_updater(actor)
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    rows = [
+        {
+            "round_id": item.round_id,
+            "player_id": item.player_id,
+            "performance_points": item.performance_points,
+            "is_man_of_match": 1 if item.is_man_of_match else 0,
+        }
+        for item in payload.items
+    ]
+    try:
+        db.execute(insert(PlayerPerformance), rows)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="round_id and player_id must reference existing rows")
+    return {"status": "ok", "inserted": len(rows)}
+
+
+# Hot read-path statements, built once at import with bindparam
+# placeholders so requests only bind values instead of rebuilding the
+# expression tree per call.
+MOM_FLAGGED_STMT = (
+    select(PlayerPerformance.player_id, User.name)
+    .join(User, User.id == PlayerPerformance.player_id)
+    .where(PlayerPerformance.round_id == bindparam("round_id"), PlayerPerformance.is_man_of_match == 1)
+    .limit(1)
+)
+
+MOM_FALLBACK_STMT = (
+    select(PlayerPerformance.player_id, User.name)
+    .join(User, User.id == PlayerPerformance.player_id)
+    .where(PlayerPerformance.round_id == bindparam("round_id"))
+    .order_by(PlayerPerformance.performance_points.desc())
+    .limit(1)
+)
+
+# Joining this CTE replaces the old IN (SELECT id FROM rounds ...)
+# membership filter, so each aggregation descends the series_id index
+# instead of re-testing a materialized subquery per row.
+_ROUNDS_CTE = select(Round.id).where(Round.series_id == bindparam("series_id")).cte("series_rounds")
+
+TEAM_TOTALS_STMT = (
+    select(Team.id, Team.name, func.coalesce(func.sum(TeamPoint.points), 0).label("total_points"))
+    .join(TeamPoint, Team.id == TeamPoint.team_id)
+    .join(_ROUNDS_CTE, _ROUNDS_CTE.c.id == TeamPoint.round_id)
+    .group_by(Team.id)
+    .order_by(func.sum(TeamPoint.points).desc())
+)
+
+MOS_STMT = (
+    select(User.id, User.name, func.coalesce(func.sum(PlayerPerformance.performance_points), 0).label("total_points"))
+    .join(PlayerPerformance, User.id == PlayerPerformance.player_id)
+    .join(_ROUNDS_CTE, _ROUNDS_CTE.c.id == PlayerPerformance.round_id)
+    .group_by(User.id)
+    .order_by(func.sum(PlayerPerformance.performance_points).desc())
+    .limit(1)
+)
+
+
 @app.get("/rounds/{round_id}/man-of-match")
-def man_of_match(round_id: int, _: User = Depends(get_actor), db: Session = Depends(get_db)):
-    winner = (
-        db.query(PlayerPerformance)
-        .filter(PlayerPerformance.round_id == round_id)
-        .order_by(PlayerPerformance.is_man_of_match.desc(), PlayerPerformance.performance_points.desc())
-        .first()
-    )
+def man_of_match(round_id: int, _: Actor = Depends(get_actor), db: Session = Depends(get_db)):
+    params = {"round_id": round_id}
+    winner = db.execute(MOM_FLAGGED_STMT, params).first()
+    if not winner:
+        # No row was explicitly flagged; fall back to the top scorer.
+        winner = db.execute(MOM_FALLBACK_STMT, params).first()
     if not winner:
         raise HTTPException(status_code=404, detail="no performance data")
-    player = db.get(User, winner.player_id)
-    return {"round_id": round_id, "player_id": player.id, "player_name": player.name}
+    return {"round_id": round_id, "player_id": winner.player_id, "player_name": winner.name}
 
 
 @app.get("/series/{series_id}/standings")
-def series_results(series_id: int, _: User = Depends(get_actor), db: Session = Depends(get_db)):
+def series_results(series_id: int, _: Actor = Depends(get_actor), db: Session = Depends(get_db)):
     series = db.get(Series, series_id)
     if not series:
         raise HTTPException(status_code=404, detail="series not found")
 
-    rounds = db.query(Round.id).filter(Round.series_id == series_id).subquery()
-
-    team_totals = (
-        db.query(Team.id, Team.name, func.sum(TeamPoint.points).label("total_points"))
-        .join(TeamPoint, Team.id == TeamPoint.team_id)
-        .filter(TeamPoint.round_id.in_(rounds))
-        .group_by(Team.id)
-        .order_by(func.sum(TeamPoint.points).desc())
-        .all()
-    )
+    params = {"series_id": series_id}
+    team_totals = db.execute(TEAM_TOTALS_STMT, params).all()
+    # The table is already ordered by total points, so the winner is the
+    # first row; man-of-the-series below is a LIMIT 1 computed in SQL.
     winner_team = team_totals[0] if team_totals else None
 
-    player_totals = (
-        db.query(User.id, User.name, func.sum(PlayerPerformance.performance_points).label("total_points"))
-        .join(PlayerPerformance, User.id == PlayerPerformance.player_id)
-        .filter(PlayerPerformance.round_id.in_(rounds))
-        .group_by(User.id)
-        .order_by(func.sum(PlayerPerformance.performance_points).desc())
-        .all()
-    )
-    mos = player_totals[0] if player_totals else None
+    mos = db.execute(MOS_STMT, params).first()
 
     return {
         "series_id": series_id,
-        "winner_team": None if not winner_team else {"team_id": winner_team.id, "team_name": winner_team.name, "points": int(winner_team.total_points or 0)},
-        "man_of_the_series": None if not mos else {"player_id": mos.id, "player_name": mos.name, "points": int(mos.total_points or 0)},
+        "winner_team": None if not winner_team else {"team_id": winner_team.id, "team_name": winner_team.name, "points": winner_team.total_points},
+        "man_of_the_series": None if not mos else {"player_id": mos.id, "player_name": mos.name, "points": mos.total_points},
         "team_table": [
-            {"team_id": row.id, "team_name": row.name, "points": int(row.total_points or 0)} for row in team_totals
+            {"team_id": row.id, "team_name": row.name, "points": row.total_points} for row in team_totals
         ],
     }